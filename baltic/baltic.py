@@ -1,19 +1,57 @@
 from matplotlib.collections import LineCollection
-import re,copy,math,json,sys
+import re,copy,math,json,sys,calendar
 import datetime as dt
-from functools import reduce
+import numpy as np
+from functools import reduce,lru_cache
 from matplotlib.collections import LineCollection
 
-__all__ = ['decimalDate', 'convertDate', 'calendarDate', 'reticulation', # make from baltic import * safe
+__all__ = ['decimalDate', 'decimalDates', 'convertDate', 'calendarDate', 'reticulation', # make from baltic import * safe
            'clade', 'leaf', 'node', 'tree',
            'make_tree', 'make_treeJSON', 'loadJSON', 'loadNexus', 'loadNewick', 'untangle']
 
 sys.setrecursionlimit(9001)
 
+_compiled_regex={} ## cache of user-supplied regexes (tip dates, tree strings), compiled once per pattern
+_dimensions_regex=re.compile(r'dimensions ntax=([0-9]+);')
+_translate_command_regex=re.compile(r'^[ \t\r]*translate[ \t\r]*$',re.IGNORECASE|re.MULTILINE) ## line with nothing but the translate command
+_translate_regex=re.compile(r'^[ \t]*([0-9]+) ([A-Za-z\-\_\/\.\'0-9 \|?]+)',re.MULTILINE) ## one tip translation per line
+
+def _compile(pattern):
+    """ Return compiled version of a regex pattern, compiling it only the first time it's seen. """
+    compiled=_compiled_regex.get(pattern)
+    if compiled is None:
+        compiled=_compiled_regex[pattern]=re.compile(pattern)
+    return compiled
+
+_year_bounds={} ## beginning of year and number of seconds in year, keyed by year
+
+def _yearBounds(year):
+    """ Return beginning of the year and length of the year in seconds, computing them only the first time a year is seen. """
+    bounds=_year_bounds.get(year)
+    if bounds is None:
+        boy = dt.datetime(year, 1, 1) ## get beginning of the year
+        eoy = dt.datetime(year + 1, 1, 1) ## get beginning of next year
+        bounds=_year_bounds[year]=(boy,(eoy - boy).total_seconds())
+    return bounds
+
+_iso_date_regex=re.compile('[0-9]{4}-[0-9]{2}-[0-9]{2}') ## ASCII digits only, str.isdigit() would accept other scripts
+
+def _parseISODate(date):
+    """ Parse a complete %Y-%m-%d date without strptime. Returns None if date is not in that format. """
+    if len(date) == 10 and _iso_date_regex.fullmatch(date) is not None:
+        return dt.datetime(int(date[:4]), int(date[5:7]), int(date[8:10]))
+    return None
+
 def decimalDate(date,fmt="%Y-%m-%d",variable=False):
     """ Converts calendar dates in specified format to decimal date. """
     if fmt == "":
         return date
+    if fmt == "%Y-%m-%d":
+        adatetime = _parseISODate(date)
+        if adatetime is not None: ## complete ISO date - skip strptime
+            boy, year_seconds = _yearBounds(adatetime.year)
+            return adatetime.year + (adatetime - boy).total_seconds() / year_seconds ## return fractional year
+
     delimiter=re.search('[^0-9A-Za-z%]',fmt) ## search for non-alphanumeric symbols in fmt (should be field delimiter)
     delimit=None
     if delimiter is not None:
@@ -32,25 +70,89 @@ def decimalDate(date,fmt="%Y-%m-%d",variable=False):
 
     adatetime=dt.datetime.strptime(date,fmt) ## convert to datetime object
     year = adatetime.year ## get year
-    boy = dt.datetime(year, 1, 1) ## get beginning of the year
-    eoy = dt.datetime(year + 1, 1, 1) ## get beginning of next year
-    return year + ((adatetime - boy).total_seconds() / ((eoy - boy).total_seconds())) ## return fractional year
+    boy, year_seconds = _yearBounds(year) ## get beginning of the year and its length
+    return year + (adatetime - boy).total_seconds() / year_seconds ## return fractional year
+
+def decimalDates(dates,fmt="%Y-%m-%d",variable=False):
+    """ Converts a list of calendar dates in specified format to a list of decimal dates.
+        Complete ISO dates (%Y-%m-%d) are converted in one go with numpy, anything else goes through decimalDate. """
+    if fmt=="%Y-%m-%d" and len(dates)>0 and all(len(date)==10 for date in dates): ## every date is complete, no need to check for variable dates
+        try:
+            adatetimes=np.array(dates,dtype='datetime64[s]') ## parse all dates at once
+        except ValueError: ## numpy couldn't parse dates - leave it to strptime
+            pass
+        else:
+            years=adatetimes.astype('datetime64[Y]') ## get years
+            boy=years.astype('datetime64[s]') ## get beginning of each year
+            eoy=(years+1).astype('datetime64[s]') ## get beginning of each next year
+            return (years.astype(np.int64)+1970+(adatetimes-boy).astype(np.int64)/(eoy-boy).astype(np.int64)).tolist() ## return fractional years
+    return [decimalDate(date,fmt=fmt,variable=variable) for date in dates]
+
+_iso_formats={ ## common output formats that can skip strftime
+    '%Y-%m-%d': lambda d: '%04d-%02d-%02d'%(d.year,d.month,d.day),
+    '%Y/%m/%d': lambda d: '%04d/%02d/%02d'%(d.year,d.month,d.day),
+    '%Y-%m-%dT%H:%M:%S': lambda d: '%04d-%02d-%02dT%02d:%02d:%02d'%(d.year,d.month,d.day,d.hour,d.minute,d.second)
+}
+
+def _formatDate(adatetime,fmt):
+    """ Format datetime object, bypassing strftime for common formats. """
+    if fmt in _iso_formats and adatetime.year>=1000: ## strftime doesn't zero-pad years before 1000 on all platforms
+        return _iso_formats[fmt](adatetime)
+    return dt.datetime.strftime(adatetime,fmt)
 
 def calendarDate(timepoint,fmt='%Y-%m-%d'):
     """ Converts decimal dates to a specified calendar date format. """
     year = int(timepoint)
     rem = timepoint - year
 
-    base = dt.datetime(year, 1, 1)
-    result = base + dt.timedelta(seconds=(base.replace(year=base.year + 1) - base).total_seconds() * rem)
+    year_seconds = 31622400.0 if calendar.isleap(year) else 31536000.0 ## number of seconds in a leap (366 days) or regular year (365 days)
+    result = dt.datetime(year, 1, 1) + dt.timedelta(seconds=year_seconds * rem)
 
-    return dt.datetime.strftime(result,fmt)
+    return _formatDate(result,fmt)
+
+@lru_cache(maxsize=64)
+def _dateConverter(start,end):
+    """ Return a function that converts calendar dates from start to end format, built once per pair of formats. """
+    if start == '%Y-%m-%d':
+        def convert(x):
+            adatetime = _parseISODate(x)
+            if adatetime is None: ## not a complete ISO date - leave it to strptime
+                adatetime = dt.datetime.strptime(x,start)
+            return _formatDate(adatetime,end)
+    else:
+        def convert(x):
+            return _formatDate(dt.datetime.strptime(x,start),end)
+    return convert
 
 def convertDate(x,start,end):
     """ Converts calendar dates between given formats """
-    return dt.datetime.strftime(dt.datetime.strptime(x,start),end)
+    return _dateConverter(start,end)(x)
+
+_NODE,_LEAF,_CLADE,_RETICULATION=0,1,2,3 ## branch class codes, comparing these is cheaper than calling is_node()/is_leaf()
+
+def _getState(self):
+    """ Return branch attributes for pickling or copying, slot values merged with the instance dict. """
+    state=dict(self.__dict__)
+    for attr in type(self).__slots__:
+        if attr!='__dict__' and hasattr(self,attr): ## unset slots are left out
+            state[attr]=getattr(self,attr)
+    return state
+
+def _setState(self,state):
+    """ Restore branch attributes when unpickling or copying, including branches pickled before branch classes had __slots__. """
+    if isinstance(state,tuple): ## (instance dict, slot values) from branches with __slots__
+        dict_state,slot_state=state
+        state={}
+        state.update(dict_state or {})
+        state.update(slot_state or {})
+    for attr,value in (state or {}).items(): ## setattr fills slots, anything else goes to instance dict
+        setattr(self,attr,value)
 
 class reticulation: ## reticulation class (recombination, conversion, reassortment)
+    __slots__=('branchType','length','height','absoluteTime','parent','traits','index','name','x','y','width','target','__dict__') ## __dict__ keeps other attributes (e.g. contribution) assignable
+    branchCode=_RETICULATION
+    __getstate__=_getState
+    __setstate__=_setState
     def __init__(self,name):
         self.branchType='leaf'
         self.length=0.0
@@ -75,6 +177,10 @@ class reticulation: ## reticulation class (recombination, conversion, reassortme
         return False
 
 class clade: ## clade class
+    __slots__=('branchType','subtree','leaves','length','height','absoluteTime','parent','traits','index','name','x','y','lastHeight','lastAbsoluteTime','width','__dict__')
+    branchCode=_CLADE
+    __getstate__=_getState
+    __setstate__=_setState
     def __init__(self,givenName):
         self.branchType='leaf' ## clade class poses as a leaf
         self.subtree=None ## subtree will contain all the branches that were collapsed
@@ -102,6 +208,10 @@ class clade: ## clade class
         return False
 
 class node: ## node class
+    __slots__=('branchType','length','height','absoluteTime','parent','children','traits','index','childHeight','x','y','leaves','__dict__') ## __dict__ keeps other attributes (e.g. yRange) assignable
+    branchCode=_NODE
+    __getstate__=_getState
+    __setstate__=_setState
     def __init__(self):
         self.branchType='node'
         self.length=0.0 ## branch length, recovered from string
@@ -127,6 +237,10 @@ class node: ## node class
         return True
 
 class leaf: ## leaf class
+    __slots__=('branchType','name','index','length','absoluteTime','height','parent','traits','x','y','__dict__')
+    branchCode=_LEAF
+    __getstate__=_getState
+    __setstate__=_setState
     def __init__(self):
         self.branchType='leaf'
         self.name=None ## name of tip after translation, since BEAST trees will generally have numbers for taxa but will provide a map at the beginning of the file
@@ -178,7 +292,7 @@ class tree: ## tree class
             self.root=new_node
 
         new_node.parent=self.cur_node ## new node's parent is current node
-        assert self.cur_node.is_node(), 'Attempted to add a child to a non-node object. Check if tip names have illegal characters like parentheses.'
+        assert self.cur_node.branchCode==_NODE, 'Attempted to add a child to a non-node object. Check if tip names have illegal characters like parentheses.'
         self.cur_node.children.append(new_node) ## new node is a child of current node
         self.cur_node=new_node ## current node is now new node
         self.Objects.append(self.cur_node) ## add new node to list of objects in the tree
@@ -190,7 +304,7 @@ class tree: ## tree class
         if self.root is None: self.root=new_leaf
 
         new_leaf.parent=self.cur_node ## leaf's parent is current node
-        assert self.cur_node.is_node(), 'Attempted to add a child to a non-node object. Check if tip names have illegal characters like parentheses.'
+        assert self.cur_node.branchCode==_NODE, 'Attempted to add a child to a non-node object. Check if tip names have illegal characters like parentheses.'
         self.cur_node.children.append(new_leaf) ## assign leaf to parent's children
         new_leaf.name=name
         self.cur_node=new_leaf ## current node is now new leaf
@@ -205,7 +319,7 @@ class tree: ## tree class
             If this is undesired call singleType() on the resulting subtree afterwards. """
         subtree=copy.deepcopy(self.traverse_tree(k,include_condition=lambda k:True,traverse_condition=traverse_condition))
 
-        if subtree is None or len([k for k in subtree if k.is_leaf()])==0:
+        if subtree is None or len([k for k in subtree if k.branchCode==_LEAF])==0:
             return None
         else:
             local_tree=tree() ## create a new tree object where the subtree will be
@@ -234,9 +348,9 @@ class tree: ## tree class
 
     def singleType(self):
         """ Removes any branches with a single child (multitype nodes). """
-        multiTypeNodes=[k for k in self.Objects if k.is_node() and len(k.children)==1]
+        multiTypeNodes=[k for k in self.Objects if k.branchCode==_NODE and len(k.children)==1]
         while len(multiTypeNodes)>0:
-            multiTypeNodes=[k for k in self.Objects if k.is_node() and len(k.children)==1]
+            multiTypeNodes=[k for k in self.Objects if k.branchCode==_NODE and len(k.children)==1]
 
             for k in sorted(multiTypeNodes,key=lambda x:-x.height):
                 child=k.children[0] ## fetch child
@@ -299,13 +413,13 @@ class tree: ## tree class
 
             if traverse_condition==None and include_condition==None: ## reset heights if traversing from scratch
                 for k in self.Objects: ## reset various parameters
-                    if k.is_node():
+                    if k.branchCode==_NODE:
                         k.leaves=set()
                         k.childHeight=None
                     k.height=None
 
         if traverse_condition==None: traverse_condition=lambda k: True
-        if include_condition==None: include_condition=lambda k: k.is_leaf()
+        if include_condition==None: include_condition=lambda k: k.branchCode==_LEAF
 
         if collect==None: ## initiate collect list if not initiated
             collect=[]
@@ -320,16 +434,16 @@ class tree: ## tree class
         if include_condition(cur_node): ## test if interested in cur_node
             collect.append(cur_node) ## add to collect list for reporting later
 
-        if cur_node.is_leaf() and self.root!=cur_node: ## cur_node is a tip (and tree is not single tip)
+        if cur_node.branchCode==_LEAF and self.root!=cur_node: ## cur_node is a tip (and tree is not single tip)
             cur_node.parent.leaves.add(cur_node.name) ## add to parent's list of tips
 
-        elif cur_node.is_node(): ## cur_node is node
+        elif cur_node.branchCode==_NODE: ## cur_node is node
             for child in filter(traverse_condition,cur_node.children): ## only traverse through children we're interested
                 if verbose==True: print('visiting child %s'%(child.index))
                 self.traverse_tree(cur_node=child,include_condition=include_condition,traverse_condition=traverse_condition,verbose=verbose,collect=collect) ## recurse through children
                 if verbose==True: print('child %s done'%(child.index))
             assert len(cur_node.children)>0, 'Tried traversing through hanging node without children. Index: %s'%(cur_node.index)
-            cur_node.childHeight=max([child.childHeight if child.is_node() else child.height for child in cur_node.children])
+            cur_node.childHeight=max([child.childHeight if child.branchCode==_NODE else child.height for child in cur_node.children])
 
             if cur_node.parent:
                 cur_node.parent.leaves=cur_node.parent.leaves.union(cur_node.leaves) ## pass tips seen during traversal to parent
@@ -347,7 +461,7 @@ class tree: ## tree class
 
     def sortBranches(self,descending=True,sort_function=None,sortByHeight=True):
         mod=-1 if descending else -1
-        if sort_function==None: sort_function=lambda k: (k.is_node(),-len(k.leaves)*mod,k.length*mod) if k.is_node() else (k.is_node(),k.length*mod)
+        if sort_function==None: sort_function=lambda k: (k.branchCode==_NODE,-len(k.leaves)*mod,k.length*mod) if k.branchCode==_NODE else (k.branchCode==_NODE,k.length*mod)
         if sortByHeight: # Sort nodes by height and group nodes and leaves together
             """ Sort descendants of each node. """
 
@@ -396,7 +510,7 @@ class tree: ## tree class
 
         if pad_nodes!=None: ## will be padding nodes
             for n in pad_nodes: ## iterate over nodes whose descendants will be padded
-                idx=sorted([name_order[lf] for lf in n.leaves]) if n.is_node() else [order.index(n)] ## indices of all tips to be padded
+                idx=sorted([name_order[lf] for lf in n.leaves]) if n.branchCode==_NODE else [order.index(n)] ## indices of all tips to be padded
                 for i,k in enumerate(order): ## iterate over all tips
 
                     if i<idx[0]: ## tip below clade
@@ -425,8 +539,8 @@ class tree: ## tree class
                     k.y=y
                     drawn[k.index]=None ## remember that this objects has been drawn
                     if verbose==True: print('%s (%s branches drawn)'%(k.y,len(drawn)))
-                    minYrange=min([min(child.yRange) if child.is_node() else child.y for child in k.children]) ## get lowest y coordinate across children
-                    maxYrange=max([max(child.yRange) if child.is_node() else child.y for child in k.children]) ## get highest y coordinate across children
+                    minYrange=min([min(child.yRange) if child.branchCode==_NODE else child.y for child in k.children]) ## get lowest y coordinate across children
+                    maxYrange=max([max(child.yRange) if child.branchCode==_NODE else child.y for child in k.children]) ## get highest y coordinate across children
                     setattr(k,'yRange',[minYrange,maxYrange]) ## assign the maximum extent of children's y coordinates
 
             if len(self.Objects)>len(drawn):
@@ -436,7 +550,7 @@ class tree: ## tree class
         yvalues=[k.y for k in self.Objects] ## all y values
         self.ySpan=max(yvalues)-min(yvalues)+min(yvalues)*2 ## determine appropriate y axis span of tree
 
-        if self.root.is_node():
+        if self.root.branchCode==_NODE:
             self.root.x=min([q.x-q.length for q in self.root.children if q.x!=None]) ## set root x and y coordinates
             children_y_coords=[q.y for q in self.root.children if q.y!=None]
             self.root.y=sum(children_y_coords)/float(len(children_y_coords))
@@ -449,14 +563,14 @@ class tree: ## tree class
         Code translated from https://github.com/nextstrain/auspice/commit/fc50bbf5e1d09908be2209450c6c3264f298e98c, written by Richard Neher.
         """
         if n==None:
-            total=sum([1 if x.is_leaf() else x.width+1 for x in self.getExternal()])
+            total=sum([1 if x.branchCode==_LEAF else x.width+1 for x in self.getExternal()])
             n=self.root#.children[0]
             for k in self.Objects:
                 k.traits['tau']=2*math.pi*rotate
                 k.x=0.0
                 k.y=0.0
 
-        w=2*math.pi*1.0/float(total) if n.is_leaf() else 2*math.pi*len(n.leaves)/float(total)
+        w=2*math.pi*1.0/float(total) if n.branchCode==_LEAF else 2*math.pi*len(n.leaves)/float(total)
 
         if n.parent.x==None:
             n.parent.x=0.0
@@ -466,9 +580,9 @@ class tree: ## tree class
         n.y = n.parent.y + n.length * math.sin(n.traits['tau'] + w*0.5)
         eta=n.traits['tau']
 
-        if n.is_node():
+        if n.branchCode==_NODE:
             for ch in n.children:
-                w=2*math.pi*1.0/float(total) if ch.is_leaf() else 2*math.pi*len(ch.leaves)/float(total)
+                w=2*math.pi*1.0/float(total) if ch.branchCode==_LEAF else 2*math.pi*len(ch.leaves)/float(total)
 
                 ch.traits['tau'] = eta
                 eta += w
@@ -490,7 +604,7 @@ class tree: ## tree class
 
     def collapseSubtree(self,cl,givenName,verbose=False,widthFunction=lambda k:len(k.leaves)):
         """ Collapse an entire subtree into a clade object. """
-        assert cl.is_node(),'Cannot collapse non-node class'
+        assert cl.branchCode==_NODE,'Cannot collapse non-node class'
         collapsedClade=clade(givenName)
         collapsedClade.index=cl.index
         collapsedClade.leaves=cl.leaves
@@ -546,7 +660,7 @@ class tree: ## tree class
         """
         newTree=copy.deepcopy(self) ## work on a copy of the tree
         if len(designated_nodes)==0: ## no nodes were designated for deletion - relying on anonymous function to collapse nodes
-            nodes_to_delete=list(filter(lambda n: n.is_node() and collapseIf(n)==True and n!=newTree.root, newTree.Objects)) ## fetch a list of all nodes who are not the root and who satisfy the condition
+            nodes_to_delete=list(filter(lambda n: n.branchCode==_NODE and collapseIf(n)==True and n!=newTree.root, newTree.Objects)) ## fetch a list of all nodes who are not the root and who satisfy the condition
         else:
             assert [w.branchType for w in designated_nodes].count('node')==len(designated_nodes),'Non-node class detected in list of nodes designated for deletion'
             assert len([w for w in designated_nodes if w!=newTree.root])==0,'Root node was designated for deletion'
@@ -576,7 +690,7 @@ class tree: ## tree class
                 nodes_to_delete.remove(k) ## in fact, the node never existed
 
                 if len(designated_nodes)==0:
-                    nodes_to_delete==list(filter(lambda n: n.is_node() and collapseIf(n)==True and n!=newTree.root, newTree.Objects))
+                    nodes_to_delete==list(filter(lambda n: n.branchCode==_NODE and collapseIf(n)==True and n!=newTree.root, newTree.Objects))
                 else:
                     assert [w.branchType for w in designated_nodes].count('node')==len(designated_nodes),'Non-node class detected in list of nodes designated for deletion'
                     assert len([w for w in designated_nodes if w!=newTree.root])==0,'Root node was designated for deletion'
@@ -629,7 +743,7 @@ class tree: ## tree class
                         if verbose==True: print('adding range comment %s'%(comment[-1]))
                 elif verbose==True: print('trait %s unavailable for %s (%s)'%(tr,cur_node.index,cur_node.branchType))
 
-        if cur_node.is_node():
+        if cur_node.branchCode==_NODE:
             if verbose==True: print('node: %s'%(cur_node.index))
             string_fragment.append('(')
             traverseChildren=list(filter(traverse_condition,cur_node.children))
@@ -641,7 +755,7 @@ class tree: ## tree class
                     string_fragment.append(',')
             string_fragment.append(')') ## last child, node terminates
 
-        elif cur_node.is_leaf():
+        elif cur_node.branchCode==_LEAF:
             if rename==None:
                 treeName=cur_node.name ## designated numName
             else:
@@ -688,7 +802,7 @@ class tree: ## tree class
         Returns a new baltic tree object.
         """
         assert len(keep)>0,"No tips given to reduce the tree to."
-        assert len([k for k in keep if not k.is_leaf()])==0, "Embedding contains %d non-leaf branches."%(len([k for k in keep if k.is_leaf()==False]))
+        assert len([k for k in keep if k.branchCode!=_LEAF])==0, "Embedding contains %d non-leaf branches."%(len([k for k in keep if k.branchCode!=_LEAF]))
         if verbose==True: print("Preparing branch hash for keeping %d branches"%(len(keep)))
         branch_hash={k.index:k for k in keep}
         embedding=[]
@@ -703,7 +817,7 @@ class tree: ## tree class
                     embedding.append(cur_b) ## keep track of the path to root
                     cur_b=cur_b.parent
         embedding.append(reduced_tree.root) ## add root to embedding
-        if verbose==True: print("Finished extracting embedding with %s branches (%s tips, %s nodes)"%(len(embedding),len([w for w in embedding if w.is_leaf()]),len([w for w in embedding if w.is_node()])))
+        if verbose==True: print("Finished extracting embedding with %s branches (%s tips, %s nodes)"%(len(embedding),len([w for w in embedding if w.branchCode==_LEAF]),len([w for w in embedding if w.branchCode==_NODE])))
         embedding=set(embedding) ## prune down to only unique branches
 
         reduced_tree.Objects=sorted(list(embedding),key=lambda x:x.height) ## assign branches that are kept to new tree's Objects
@@ -728,7 +842,7 @@ class tree: ## tree class
         Get all branches whose branchType is "leaf".
         A function can be provided to filter internal nodes according to an additional property.
         """
-        externals=list(filter(secondFilter,filter(lambda k: k.is_leaf(),self.Objects)))
+        externals=list(filter(secondFilter,filter(lambda k: k.branchCode==_LEAF,self.Objects)))
         return externals
 
     def getInternal(self,secondFilter=None):
@@ -736,7 +850,7 @@ class tree: ## tree class
         Get all branches whose branchType is "node".
         A function can be provided to filter internal nodes according to an additional property.
         """
-        internals=list(filter(secondFilter,filter(lambda k: k.is_node(),self.Objects)))
+        internals=list(filter(secondFilter,filter(lambda k: k.branchCode==_NODE,self.Objects)))
         return internals
 
     def getBranches(self,attrs=lambda x:True,warn=True):
@@ -767,11 +881,31 @@ class tree: ## tree class
             params=[k.traits[statistic] for k in branches if statistic in k.traits]
         return params
 
+    def toArrays(self,attrs=('length','height','absoluteTime')):
+        """
+        Return the tree as a dictionary of numpy arrays, where branch i is the i-th branch in self.Objects.
+        'parent' holds the index of each branch's parent (-1 for branches whose parent is not in the tree, e.g. root).
+        Children of branch i are children_ids[children_offsets[i]:children_offsets[i+1]].
+        Every attribute in attrs is returned as a float array, with nan where the attribute is not set.
+        """
+        N=len(self.Objects)
+        position={k: i for i,k in enumerate(self.Objects)} ## index of every branch
+        arrays={'parent': np.fromiter((position.get(k.parent,-1) for k in self.Objects),dtype=np.int32,count=N)}
+
+        N_children=np.fromiter((len(k.children) if k.branchCode==_NODE else 0 for k in self.Objects),dtype=np.int32,count=N)
+        arrays['children_offsets']=np.zeros(N+1,dtype=np.int32)
+        np.cumsum(N_children,out=arrays['children_offsets'][1:])
+        arrays['children_ids']=np.fromiter((position.get(child,-1) for k in self.Objects if k.branchCode==_NODE for child in k.children),dtype=np.int32,count=arrays['children_offsets'][-1])
+
+        for attr in attrs:
+            arrays[attr]=np.array([getattr(k,attr,None) for k in self.Objects],dtype=np.float64) ## None becomes nan
+        return arrays
+
     def fixHangingNodes(self):
         """
         Remove internal nodes without any children.
         """
-        hangingCondition=lambda k: k.is_node() and len(k.children)==0
+        hangingCondition=lambda k: k.branchCode==_NODE and len(k.children)==0
         hangingNodes=list(filter(hangingCondition,self.Objects)) ## check for nodes without any children (hanging nodes)
         while len(hangingNodes)>0:
             for h in sorted(hangingNodes,key=lambda x:-x.height):
@@ -781,7 +915,7 @@ class tree: ## tree class
             hangingNodes=list(filter(hangingCondition,self.Objects)) ## regenerate list
 
     def addText(self,ax,target=None,x_attr=None,y_attr=None,text=None,zorder=None,**kwargs):
-        if target==None: target=lambda k: k.is_leaf()
+        if target==None: target=lambda k: k.branchCode==_LEAF
         if x_attr==None: x_attr=lambda k: k.x
         if y_attr==None: y_attr=lambda k: k.y
         if text==None: text=lambda k: k.name
@@ -794,7 +928,7 @@ class tree: ## tree class
 
     def plotPoints(self,ax,x_attr=None,y_attr=None,target=None,size=None,colour=None,
                zorder=None,outline=None,outline_size=None,outline_colour=None,**kwargs):
-        if target==None: target=lambda k: k.is_leaf()
+        if target==None: target=lambda k: k.branchCode==_LEAF
         if x_attr==None: x_attr=lambda k:k.x
         if y_attr==None: y_attr=lambda k:k.y
         if size==None: size=40
@@ -859,7 +993,7 @@ class tree: ## tree class
 
             if connection_type=='baltic':
                 branches.append(((xp,y),(x,y)))
-                if k.is_node():
+                if k.branchCode==_NODE:
                     yl,yr=y_attr(k.children[0]),y_attr(k.children[-1])
                     branches.append(((x,yl),(x,yr)))
                     linewidths.append(linewidths[-1])
@@ -915,7 +1049,7 @@ class tree: ## tree class
             Y=math.cos(y)
             branches.append(((X*xp,Y*xp),(X*x,Y*x)))
 
-            if k.is_node():
+            if k.branchCode==_NODE:
                 yl,yr=y_attr(k.children[0]),y_attr(k.children[-1]) ## get leftmost and rightmost children's y coordinates
                 yl=circ_s+circ*yl/self.ySpan ## transform y into a fraction of total y
                 yr=circ_s+circ*yr/self.ySpan
@@ -935,7 +1069,7 @@ class tree: ## tree class
 
     def plotCircularPoints(self,ax,x_attr=None,y_attr=None,target=None,size=None,colour=None,circStart=0.0,circFrac=1.0,inwardSpace=0.0,normaliseHeight=None,
                zorder=None,outline=None,outline_size=None,outline_colour=None,**kwargs):
-        if target==None: target=lambda k: k.is_leaf()
+        if target==None: target=lambda k: k.branchCode==_LEAF
         if x_attr==None: x_attr=lambda k:k.x
         if y_attr==None: y_attr=lambda k:k.y
         if size==None: size=40
@@ -1014,7 +1148,7 @@ def untangle(trees,cost_function=None,iterations=None,verbose=False):
                 if len(k.children)>=10: raise RuntimeWarning('Node is too polytomic and untangling will take an astronomically long time')
                 if verbose==True: print(len(k.children))
                 for permutation in permutations(k.children): ## iterate over permutations of node's children
-                    clade_order=sum([[child.name] if child.is_leaf() else list(child.leaves) for child in permutation],[]) ## flat list of tip names as they would appear in permutation order
+                    clade_order=sum([[child.name] if child.branchCode==_LEAF else list(child.leaves) for child in permutation],[]) ## flat list of tip names as they would appear in permutation order
                     new_y_positions={clade_order[i]: clade_y_positions[i] for i in range(len(clade_y_positions))} ## assign available y positions in order
 
                     tip_costs=list(map(cost_function,[(y_positions[tree1][tip],new_y_positions[tip]) for tip in clade_order if tip in y_positions[tree1]]))
@@ -1029,14 +1163,21 @@ def untangle(trees,cost_function=None,iterations=None,verbose=False):
 
     return trees
 
+_tree_patterns = { ## regexes used by make_tree, compiled once
+    'beast_tip': re.compile(r'(\(|,)([0-9]+)(\[|\:)'),
+    'non_beast_tip': re.compile(r'(\(|,)(\'|\")*([^\(\):\[\'\"#]+)(\'|\"|)*(\[)*'),
+    'multitype_node': re.compile(r'\)([0-9]+)\['),
+    'reticulation_start': re.compile(r'[\(,](#[A-Za-z0-9]+)'),
+    'reticulation_end': re.compile(r'\)(#[A-Za-z0-9]+)'),
+    'comment': re.compile(r'(\:)*\[(&[A-Za-z\_\-{}\,0-9\.\%=\"\'\+!# :\/\(\)\&]+)\]'),
+    'label': re.compile(r'([A-Za-z\_\-0-9\.]+)(\:|\;)'),
+    'length': re.compile(r'(\:)*([0-9\.\-Ee]+)')
+}
+
 def make_tree(data,ll=None,verbose=False):
     """
     data is a tree string, ll (LL) is an instance of a tree object
     """
-    patterns = {
-        'beast_tip': r'(\(|,)([0-9]+)(\[|\:)',
-        'non_beast_tip': r'(\(|,)(\'|\")*([^\(\):\[\'\"#]+)(\'|\"|)*(\[)*'
-    }
     if isinstance(data,str)==False: ## tree string is not an instance of string (could be unicode) - convert
         data=str(data)
 
@@ -1056,24 +1197,24 @@ def make_tree(data,ll=None,verbose=False):
             ll.add_node(i) ## add node to current node in tree ll
             i+=1 ## advance in tree string by one character
 
-        cerberus=re.match(patterns['beast_tip'],data[i-1:i+100]) ## look for tips in BEAST format (integers).
+        cerberus=_tree_patterns['beast_tip'].match(data,i-1,i+100) ## look for tips in BEAST format (integers).
         if cerberus is not None:
             if verbose==True: print('%d adding leaf (BEAST) %s'%(i,cerberus.group(2)))
             ll.add_leaf(i,cerberus.group(2)) ## add tip
             i+=len(cerberus.group(2)) ## advance in tree string by however many characters the tip is encoded
 
-        cerberus=re.match(patterns['non_beast_tip'],data[i-1:i+200])  ## look for tips with unencoded names - if the tips have some unusual format you'll have to modify this
+        cerberus=_tree_patterns['non_beast_tip'].match(data,i-1,i+200)  ## look for tips with unencoded names - if the tips have some unusual format you'll have to modify this
         if cerberus is not None:
             if verbose==True: print('%d adding leaf (non-BEAST) %s'%(i,cerberus.group(3)))
             ll.add_leaf(i,cerberus.group(3).strip('"').strip("'"))  ## add tip
             i+=len(cerberus.group(3))+cerberus.group().count("'")+cerberus.group().count('"') ## advance in tree string by however many characters the tip is encoded
 
-        cerberus=re.match(r'\)([0-9]+)\[',data[i-1:i+100]) ## look for multitype tree singletons.
+        cerberus=_tree_patterns['multitype_node'].match(data,i-1,i+100) ## look for multitype tree singletons.
         if cerberus is not None:
             if verbose==True: print('%d adding multitype node %s'%(i,cerberus.group(1)))
             i+=len(cerberus.group(1))
 
-        cerberus=re.match(r'[\(,](#[A-Za-z0-9]+)',data[i-1:i+200]) ## look for beginning of reticulate branch
+        cerberus=_tree_patterns['reticulation_start'].match(data,i-1,i+200) ## look for beginning of reticulate branch
         if cerberus is not None:
             if verbose==True: print('%d adding outgoing reticulation branch %s'%(i,cerberus.group(1)))
             ll.add_reticulation(cerberus.group(1)) ## add reticulate branch
@@ -1093,7 +1234,7 @@ def make_tree(data,ll=None,verbose=False):
                 if verbose==True: print('destination of %s not identified yet'%(cerberus.group(1)))
             i+=len(cerberus.group())-1
 
-        cerberus=re.match(r'\)(#[A-Za-z0-9]+)',data[i-1:i+200]) ## look for landing point of reticulate branch
+        cerberus=_tree_patterns['reticulation_end'].match(data,i-1,i+200) ## look for landing point of reticulate branch
         if cerberus is not None:
             if verbose==True: print('%d adding incoming reticulation branch %s'%(i,cerberus.group(1)))
             ll.cur_node.traits['label']=cerberus.group(1) ## set node label
@@ -1113,7 +1254,7 @@ def make_tree(data,ll=None,verbose=False):
                 if verbose==True: print('origin of %s not identified yet'%(cerberus.group(1)))
             i+=len(cerberus.group())-1
 
-        cerberus=re.match(r'(\:)*\[(&[A-Za-z\_\-{}\,0-9\.\%=\"\'\+!# :\/\(\)\&]+)\]',data[i:])## look for MCC comments
+        cerberus=_tree_patterns['comment'].match(data,i)## look for MCC comments
         if cerberus is not None:
             if verbose==True: print('%d comment: %s'%(i,cerberus.group(2)))
             comment=cerberus.group(2)
@@ -1170,14 +1311,14 @@ def make_tree(data,ll=None,verbose=False):
 
             i+=len(cerberus.group()) ## advance in tree string by however many characters it took to encode labels
 
-        cerberus=re.match(r'([A-Za-z\_\-0-9\.]+)(\:|\;)',data[i:])## look for old school node labels
+        cerberus=_tree_patterns['label'].match(data,i)## look for old school node labels
         if cerberus is not None:
             if verbose==True: print('old school comment found: %s'%(cerberus.group(1)))
             ll.cur_node.traits['label']=cerberus.group(1)
 
             i+=len(cerberus.group(1))
 
-        microcerberus=re.match(r'(\:)*([0-9\.\-Ee]+)',data[i:i+100]) ## look for branch lengths without comments
+        microcerberus=_tree_patterns['length'].match(data,i,i+100) ## look for branch lengths without comments
         if microcerberus is not None:
             if verbose==True: print('adding branch length (%d) %.6f'%(i,float(microcerberus.group(2))))
             ll.cur_node.length=float(microcerberus.group(2)) ## set branch length of current node
@@ -1228,12 +1369,15 @@ def loadNewick(tree_path,tip_regex='\|([0-9]+\-[0-9]+\-[0-9]+)',date_fmt='%Y-%m-
     else:
         handle=tree_path
 
-    for line in handle:
-        l=line.strip('\n')
-        if '(' in l:
-            treeString_start=l.index('(')
-            ll=make_tree(l[treeString_start:],verbose=verbose) ## send tree string to make_tree function
-            if verbose==True: print('Identified tree string')
+    data=handle.read() ## read file in one go
+    last_bracket=data.rfind('(') ## tree string is on the last line with an opening bracket
+    if last_bracket!=-1:
+        line_start=data.rfind('\n',0,last_bracket)+1 ## beginning of the line containing the tree string
+        line_end=data.find('\n',last_bracket) ## end of the line containing the tree string
+        if line_end==-1: line_end=len(data)
+        treeString_start=data.index('(',line_start)
+        ll=make_tree(data[treeString_start:line_end],verbose=verbose) ## send tree string to make_tree function
+        if verbose==True: print('Identified tree string')
 
     assert ll,'Regular expression failed to find tree string'
     ll.traverse_tree(verbose=verbose) ## traverse tree
@@ -1241,15 +1385,10 @@ def loadNewick(tree_path,tip_regex='\|([0-9]+\-[0-9]+\-[0-9]+)',date_fmt='%Y-%m-
         ll.sortBranches() ## traverses tree, sorts branches, draws tree
 
     if absoluteTime==True:
-        tipDates=[]
-        tipNames=[]
-        for k in ll.getExternal():
-            n=k.name
-            tipNames.append(n)
-            cerberus=re.search(tip_regex,n)
-            if cerberus is not None:
-                tipDates.append(decimalDate(cerberus.group(1),fmt=date_fmt,variable=variableDate))
-        assert len(tipDates)>0,'Regular expression failed to find tip dates in tip names, review regex pattern or set absoluteTime option to False.\nFirst tip name encountered: %s\nDate regex set to: %s\nExpected date format: %s'%(tipNames[0],tip_regex,date_fmt)
+        tip_pattern=_compile(tip_regex)
+        externals=ll.getExternal()
+        tipDates=decimalDates([cerberus.group(1) for cerberus in (tip_pattern.search(k.name) for k in externals) if cerberus is not None],fmt=date_fmt,variable=variableDate)
+        assert len(tipDates)>0,'Regular expression failed to find tip dates in tip names, review regex pattern or set absoluteTime option to False.\nFirst tip name encountered: %s\nDate regex set to: %s\nExpected date format: %s'%(externals[0].name,tip_regex,date_fmt)
         highestTip=max(tipDates)
         ll.setAbsoluteTime(highestTip)
     if isinstance(tree_path,str):
@@ -1260,7 +1399,6 @@ def loadNexus(tree_path,tip_regex='\|([0-9]+\-[0-9]+\-[0-9]+)',date_fmt='%Y-%m-%
     """
     Load nexus file
     """
-    tipFlag=False
     tips={}
     tipNum=0
     ll=None
@@ -1269,32 +1407,36 @@ def loadNexus(tree_path,tip_regex='\|([0-9]+\-[0-9]+\-[0-9]+)',date_fmt='%Y-%m-%
     else:
         handle=tree_path
 
-    for line in handle:
-        l=line.strip('\n')
+    data=handle.read() ## read file in one go
+    lower_data=data.lower() ## nexus keywords are case-insensitive, lowercase file once
+
+    translate_command=_translate_command_regex.search(data) ## look for tip translation block
+    if translate_command is not None:
+        block_start=translate_command.end() ## translations begin on the line after translate
+        block_end=data.find(';',block_start) ## and end at the next semicolon
+        if block_end==-1: block_end=len(data)
+        for cerberus in _translate_regex.finditer(data,block_start,block_end):
+            tips[cerberus.group(1)]=cerberus.group(2).strip('"').strip("'")
+            if verbose==True: print('Identified tip translation %s: %s'%(cerberus.group(1),tips[cerberus.group(1)]))
 
-        cerberus=re.search('dimensions ntax=([0-9]+);',l.lower())
+    treestring_pattern=_compile(treestring_regex)
+    for l,lower_l in zip(data.split('\n'),lower_data.split('\n')): ## go through file line by line
+
+        cerberus=_dimensions_regex.search(lower_l)
         if cerberus is not None:
             tipNum=int(cerberus.group(1))
             if verbose==True: print('File should contain %d taxa'%(tipNum))
 
-        cerberus=re.search(treestring_regex,l.lower())
+        cerberus=treestring_pattern.search(lower_l)
         if cerberus is not None:
             treeString_start=l.index('(')
             ll=make_tree(l[treeString_start:]) ## send tree string to make_tree function
             if verbose==True: print('Identified tree string')
 
-        if tipFlag==True:
-            cerberus=re.search('([0-9]+) ([A-Za-z\-\_\/\.\'0-9 \|?]+)',l)
-            if cerberus is not None:
-                tips[cerberus.group(1)]=cerberus.group(2).strip('"').strip("'")
-                if verbose==True: print('Identified tip translation %s: %s'%(cerberus.group(1),tips[cerberus.group(1)]))
-            elif ';' not in l:
-                print('tip not captured by regex:',l.replace('\t',''))
-
-        if 'translate' in l.lower():
-            tipFlag=True
-        if ';' in l:
-            tipFlag=False
+    if len(tips)>0 and tipNum>0 and len(tips)!=tipNum: ## some lines in translate block were not captured
+        print('tips not captured by regex: %d translations found for %d taxa'%(len(tips),tipNum))
+    elif len(tips)==0 and tipNum>0 and 'translate' in lower_data: ## file mentions translate but no translation block was found
+        print('tips not captured by regex: no translations found for %d taxa'%(tipNum))
 
     assert ll,'Regular expression failed to find tree string'
     ll.traverse_tree() ## traverse tree
@@ -1304,15 +1446,11 @@ def loadNexus(tree_path,tip_regex='\|([0-9]+\-[0-9]+\-[0-9]+)',date_fmt='%Y-%m-%
         ll.renameTips(tips) ## renames tips from numbers to actual names
         ll.tipMap=tips
     if absoluteTime==True:
-        tipDates=[]
-        tipNames=[]
-        for k in ll.getExternal():
-            tipNames.append(k.name)
-            cerberus=re.search(tip_regex,k.name)
-            if cerberus is not None:
-                tipDates.append(decimalDate(cerberus.group(1),fmt=date_fmt,variable=variableDate))
-
-        assert len(tipDates)>0,'Regular expression failed to find tip dates in tip names, review regex pattern or set absoluteTime option to False.\nFirst tip name encountered: %s\nDate regex set to: %s\nExpected date format: %s'%(tipNames[0],tip_regex,date_fmt)
+        tip_pattern=_compile(tip_regex)
+        externals=ll.getExternal()
+        tipDates=decimalDates([cerberus.group(1) for cerberus in (tip_pattern.search(k.name) for k in externals) if cerberus is not None],fmt=date_fmt,variable=variableDate)
+
+        assert len(tipDates)>0,'Regular expression failed to find tip dates in tip names, review regex pattern or set absoluteTime option to False.\nFirst tip name encountered: %s\nDate regex set to: %s\nExpected date format: %s'%(externals[0].name,tip_regex,date_fmt)
         highestTip=max(tipDates)
         ll.setAbsoluteTime(highestTip)
 
@@ -1320,11 +1458,26 @@ def loadNexus(tree_path,tip_regex='\|([0-9]+\-[0-9]+\-[0-9]+)',date_fmt='%Y-%m-%
         handle.close()
     return ll
 
+def _parseJSON(data):
+    """ Parse JSON bytes, using orjson if it's installed (pip install baltic[orjson]) and the standard library json otherwise.
+        orjson rejects some input the json module accepts (e.g. NaN), such JSONs are handed over to json. """
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        try:
+            return orjson.loads(data)
+        except ValueError: ## orjson.JSONDecodeError is a ValueError
+            pass
+    return json.loads(data.decode('utf-8')) ## json only accepts bytes from python 3.6
+
 def loadJSON(json_object,json_translation={'name':'name','absoluteTime':'num_date'},verbose=False,sort=True,stats=True):
     """
     Load a nextstrain JSON by providing either the path to JSON or a file handle.
     json_translation is a dictionary that translates JSON attributes to baltic branch attributes (e.g. 'absoluteTime' is called 'num_date' in nextstrain JSONs).
     Note that to avoid conflicts in setting node heights you can either define the absolute time of each node or branch lengths (e.g. if you want a substitution tree).
+    Functions in json_translation are applied after attributes given as JSON keys have been set on every branch.
     """
     assert 'name' in json_translation and ('absoluteTime' in json_translation or 'length' in json_translation or 'height' in json_translation),'JSON translation dictionary missing entries: %s'%(', '.join([entry for entry in ['name','height','absoluteTime','length'] if (entry in json_translation)==False]))
     if verbose==True: print('Reading JSON')
@@ -1333,12 +1486,13 @@ def loadJSON(json_object,json_translation={'name':'name','absoluteTime':'num_dat
         if 'nextstrain.org' in json_object: ## nextsrain.org in URL - request it
             if verbose==True: print('Assume URL provided, loading JSON from nextstrain.org')
             import requests
-            from io import BytesIO as csio
-            auspice_json=json.load(csio(requests.get(json_object).content))
+            with requests.get(json_object) as response:
+                response.raise_for_status()
+                auspice_json=_parseJSON(response.content) ## parse downloaded bytes directly
         else: ## not nextstrain.org URL - assume local path to auspice v2 json
             if verbose==True: print('Loading JSON from local path')
-            with open(json_object) as json_data:
-                auspice_json = json.load(json_data)
+            with open(json_object,'rb') as json_data:
+                auspice_json=_parseJSON(json_data.read())
     else: ## not string, assume auspice v2 json object given
         if verbose==True: print('Loading JSON from object given')
         auspice_json=json_object
@@ -1350,38 +1504,67 @@ def loadJSON(json_object,json_translation={'name':'name','absoluteTime':'num_dat
     assert ('absoluteTime' in json_translation and ('length' not in json_translation or 'height' not in json_translation)) or ('absoluteTime' not in json_translation and ('length' in json_translation or 'height' in json_translation)),'Cannot use both absolute time and branch length, include only one in json_translation dictionary.'
 
     if verbose==True: print('Setting baltic traits from JSON')
-    for k in ll.Objects: ## make node attributes easier to access
-        for key in k.traits['node_attrs']:
-            if isinstance(k.traits['node_attrs'][key],dict):
-                if 'value' in k.traits['node_attrs'][key]:
-                    k.traits[key]=k.traits['node_attrs'][key]['value']
-                if 'confidence' in k.traits['node_attrs'][key]:
-                    k.traits['%s_confidence'%(key)]=k.traits['node_attrs'][key]['confidence']
+    string_translation=[] ## (attribute, JSON key) pairs
+    callable_translation=[] ## (attribute, function) pairs
+    for attr,val in json_translation.items():
+        if isinstance(val,str):
+            string_translation.append((attr,val))
+        elif callable(val):
+            callable_translation.append((attr,val))
+        else:
+            raise AttributeError('Attribute %s neither string nor callable'%(val))
+    branch_units=[branch_unit for branch_unit in ['height','absoluteTime'] if branch_unit in json_translation] ## units that branch lengths will be derived from
+    lengths_after_callables=any(attr in branch_units for attr,val in callable_translation) ## heights or absolute times are set by functions
+
+    missing=object() ## tells absent node attribute entries apart from entries set to None
+    confidence_keys={} ## trait names for confidence intervals, built once per node attribute
+    objects=ll.Objects
+    set_attribute=setattr ## local names are quicker to look up than globals and builtins within the loop
+    for k in objects: ## make node attributes easier to access, on every branch before any translation is done
+        traits=k.traits
+        for key,attr_value in traits['node_attrs'].items():
+            if isinstance(attr_value,dict):
+                value=attr_value.get('value',missing)
+                if value is not missing:
+                    traits[key]=value
+                confidence=attr_value.get('confidence',missing)
+                if confidence is not missing:
+                    confidence_key=confidence_keys.get(key)
+                    if confidence_key is None:
+                        confidence_key=confidence_keys[key]='%s_confidence'%(key)
+                    traits[confidence_key]=confidence
             elif key=='div':
-                k.traits['divergence']=k.traits['node_attrs'][key]
-
-    for attr in json_translation: ## iterate through attributes in json_translation
-        for k in ll.Objects: ## for every branch
-            if isinstance(json_translation[attr],str):
-                if json_translation[attr] in k.traits:
-                    setattr(k,attr,k.traits[json_translation[attr]]) ## set attribute value for branch
-                elif 'node_attrs' in k.traits and json_translation[attr] in k.traits['node_attrs']:
-                    setattr(k,attr,k.traits['node_attrs'][json_translation[attr]])
-                elif 'branch_attrs' in k.traits and json_translation[attr] in k.traits['branch_attrs']:
-                    setattr(k,attr,k.traits['branch_attrs'][json_translation[attr]])
-                else:
-                    raise KeyError('String attribute %s not found in JSON'%(json_translation[attr]))
-            elif callable(json_translation[attr]):
-                setattr(k,attr,json_translation[attr](k)) ## set attribute value with a function for branch
+                traits['divergence']=attr_value
+
+    for k in objects: ## set attributes from JSON keys, branch by branch
+        traits=k.traits
+        node_attrs=traits['node_attrs']
+        for attr,val in string_translation: ## iterate through attributes in json_translation
+            if val in traits:
+                set_attribute(k,attr,traits[val]) ## set attribute value for branch
+            elif val in node_attrs:
+                set_attribute(k,attr,node_attrs[val])
+            elif 'branch_attrs' in traits and val in traits['branch_attrs']:
+                set_attribute(k,attr,traits['branch_attrs'][val])
             else:
-                raise AttributeError('Attribute %s neither string nor callable'%(json_translation[attr]))
+                raise KeyError('String attribute %s not found in JSON'%(val))
 
-    for branch_unit in ['height','absoluteTime']: ## iterate between divergence and absolute time
-        if branch_unit in json_translation: ## it's available in tree
-            for k in ll.Objects: ## iterate over all branches
+        if lengths_after_callables==False:
+            for branch_unit in branch_units: ## iterate between divergence and absolute time
                 cur_branch=getattr(k,branch_unit) ## get parameter for this branch
-                par_branch=getattr(k.parent,branch_unit) ## get parameter for parental branch
-                k.length=cur_branch-par_branch if cur_branch and par_branch else 0.0 ## difference between current and parent is branch length (or, if parent unavailabel it's 0)
+                par_branch=getattr(k.parent,branch_unit) ## get parameter for parental branch (already set, parents come before children)
+                k.length=cur_branch-par_branch if cur_branch and par_branch else 0.0 ## difference between current and parent is branch length (or, if parent unavailable it's 0)
+
+    for attr,val in callable_translation: ## functions can look at attributes of other branches, so every branch gets one attribute before moving to the next
+        for k in objects:
+            set_attribute(k,attr,val(k)) ## set attribute value with a function for branch
+
+    if lengths_after_callables==True: ## branch lengths from heights or absolute times set by functions
+        for k in objects:
+            for branch_unit in branch_units:
+                cur_branch=getattr(k,branch_unit)
+                par_branch=getattr(k.parent,branch_unit)
+                k.length=cur_branch-par_branch if cur_branch and par_branch else 0.0
 
     if verbose==True: print('Traversing and drawing tree')
 
@@ -20,6 +20,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     install_requires=requirements,
+    extras_require={"orjson": ["orjson"]}, ## faster nextstrain JSON parsing
     python_requires=">=3.5.*",
     include_package_data=False,
     zip_safe=False,
@@ -1,7 +1,17 @@
 import unittest
+import io
+import os
+import json
+import math
+import tempfile
+import sys
+import copy
+import copyreg
+import pickle
 import importlib.util
 spec = importlib.util.spec_from_file_location("baltic", "baltic/baltic.py")
 bt = importlib.util.module_from_spec(spec)
+sys.modules["baltic"] = bt ## let pickle find baltic classes
 spec.loader.exec_module(bt)
 
 class test_parsers(unittest.TestCase):
@@ -50,11 +60,120 @@ class test_parsers(unittest.TestCase):
         expected_height = 0.0058
         assert max_height == expected_height, 'Newick tree height is not correct. Expected: {}. Observed: {}'.format(expected_height, max_height)
 
+    def test_json(self):
+
+        def branch(name,date,div,children=None):
+            branch={'name':name,'node_attrs':{'num_date':{'value':date,'confidence':[date-0.1,date+0.1]},'div':div}}
+            if children: branch['children']=children
+            return branch
+        auspice_json={'meta':{'colorings':[]},
+                      'tree':branch('root',2000.0,0.0,[branch('n1',2001.0,0.01,[branch('a',2003.0,0.02),branch('b',2004.5,0.03)]),branch('c',2002.0,0.015)])}
+
+        tree,meta=bt.loadJSON(auspice_json,stats=False)
+        assert len(tree.Objects) == 5
+        lengths={k.name if k.is_leaf() else k.index: k.length for k in tree.Objects}
+        assert lengths == {'root': 0.0, 'n1': 1.0, 'a': 2.0, 'b': 3.5, 'c': 2.0}, 'JSON branch lengths not derived correctly from absolute times: %s'%(lengths)
+        assert tree.root.traits['num_date_confidence'] == [1999.9,2000.1]
+        assert tree.root.traits['divergence'] == 0.0
+
+        first_child_date=lambda k: k.children[0].traits['num_date'] if k.is_node() else k.traits['num_date'] ## reads flattened traits of a later branch
+        tree,meta=bt.loadJSON(auspice_json,json_translation={'name':'name','absoluteTime':'num_date','first_date':first_child_date},stats=False)
+        assert tree.root.first_date == 2001.0
+
+        gap=lambda k: min(child.absoluteTime for child in k.children)-k.absoluteTime if k.is_node() else 0.0 ## reads translated attributes of children
+        tree,meta=bt.loadJSON(auspice_json,json_translation={'name':'name','absoluteTime':'num_date','gap':gap},stats=False)
+        assert tree.root.gap == 1.0
+
+        tree,meta=bt.loadJSON(auspice_json,json_translation={'name':'name','absoluteTime':lambda k: k.traits['num_date']},stats=False)
+        assert {k.name if k.is_leaf() else k.index: k.length for k in tree.Objects} == {'root': 0.0, 'n1': 1.0, 'a': 2.0, 'b': 3.5, 'c': 2.0}, 'Branch lengths not derived from absolute times set by a function'
+
+        with tempfile.TemporaryDirectory() as json_dir:
+            json_path=os.path.join(json_dir,'tree.json')
+            with open(json_path,'w') as json_file:
+                json_file.write(json.dumps(auspice_json).replace('"div": 0.0','"div": NaN',1)) ## NaN is valid for json, but not orjson
+            tree,meta=bt.loadJSON(json_path,stats=False)
+        assert len(tree.Objects) == 5
+        assert math.isnan(tree.root.traits['divergence'])
+
+    def test_arrays(self):
+
+        tree = bt.loadNewick('./tests/data/zika.nwk')
+        arrays = tree.toArrays()
+        assert len(arrays['parent']) == len(tree.Objects)
+        assert arrays['children_offsets'][-1] == len(tree.Objects) - 1, 'Every branch except root should be a child of another branch'
+        for i,k in enumerate(tree.Objects):
+            if k.parent in tree.Objects:
+                assert tree.Objects[arrays['parent'][i]] == k.parent
+            if k.is_node():
+                children = arrays['children_ids'][arrays['children_offsets'][i]:arrays['children_offsets'][i+1]]
+                assert [tree.Objects[c] for c in children] == k.children
+        assert arrays['height'].tolist() == [k.height for k in tree.Objects]
+
+    def test_nexus_translate(self):
+
+        nexus='''#NEXUS
+[Tree exported after translate step]
+Begin trees;
+\tTranslate
+\t\t1 A,
+\t\t2 'B',
+\t\t3 C
+;
+tree TREE1 = [&R] ((1:1.0,2:2.0):1.0,3:3.0);
+End;
+'''
+        for handle in [io.StringIO(nexus),io.StringIO(nexus.replace('\n','\r\n'),newline='')]: ## CRLF line endings without newline translation
+            tree = bt.loadNexus(handle,absoluteTime=False)
+            assert sorted([k.name for k in tree.getExternal()]) == ['A','B','C'], 'Tips not translated: %s'%([k.name for k in tree.getExternal()])
+
+    def test_pickle(self):
+
+        tree = bt.loadNewick('./tests/data/zika.nwk')
+        for protocol in range(pickle.HIGHEST_PROTOCOL+1):
+            copied = pickle.loads(pickle.dumps(tree,protocol=protocol))
+            assert [(k.index,k.length,k.height) for k in copied.Objects] == [(k.index,k.length,k.height) for k in tree.Objects], 'Tree changed when pickled with protocol %d'%(protocol)
+        assert copy.deepcopy(tree).Objects[0].children[0].parent.length == tree.Objects[0].length
+
+        class legacy_node: ## pickles like a node from before branch classes had __slots__
+            def __reduce__(self):
+                return (copyreg._reconstructor,(bt.node,object,None),{'branchType':'node','length':1.5,'children':[],'yRange':[0,1]})
+        restored = pickle.loads(pickle.dumps(legacy_node()))
+        assert isinstance(restored,bt.node)
+        assert restored.length == 1.5 and restored.yRange == [0,1]
+
     def test_nexus(self):
 
         tree = bt.loadNexus('./tests/data/2020-04-13_treetime/divergence_tree.nexus')
         tree.treeStats()
         pass
 
+class test_dates(unittest.TestCase):
+
+    def test_decimal_date(self):
+        for date in ['2016-01-01','2016-12-31','2015-07-02','2000-02-29']:
+            assert bt.decimalDate(date)==bt.decimalDate(date.replace('-','/'),fmt='%Y/%m/%d'), 'ISO decimal date does not match strptime for %s'%(date)
+        assert bt.decimalDate('2016-07-02')==2016.5
+        for convert in [bt.decimalDate,lambda date: bt.convertDate(date,'%Y-%m-%d','%Y/%m/%d')]:
+            with self.assertRaises(ValueError):
+                convert('\uff12\uff10\uff11\uff16-\uff10\uff17-\uff10\uff12') ## full-width digits are not valid dates
+
+    def test_decimal_dates(self):
+        dates=['2016-01-01','2016-12-31','2015-07-02','2000-02-29']
+        assert bt.decimalDates(dates)==[bt.decimalDate(d) for d in dates], 'Vectorised decimal dates do not match decimalDate'
+        assert bt.decimalDates(['2016-03','2016'],variable=True)==[bt.decimalDate('2016-03',variable=True),bt.decimalDate('2016',variable=True)]
+        assert bt.decimalDates([])==[]
+
+    def test_calendar_date(self):
+        assert bt.calendarDate(2015.0)=='2015-01-01'
+        assert bt.calendarDate(2015.5)=='2015-07-02'
+        assert bt.calendarDate(2016.5)=='2016-07-02' ## leap year
+        assert bt.calendarDate(2016.5,fmt='%d/%m/%Y')=='02/07/2016'
+
+    def test_convert_date(self):
+        assert bt.convertDate('02/07/2016','%d/%m/%Y','%Y-%m-%d')=='2016-07-02'
+        assert bt.convertDate('2016-07-02','%Y-%m-%d','%Y/%m/%d')=='2016/07/02'
+        assert bt.convertDate('2016-07-02','%Y-%m-%d','%Y-%m-%dT%H:%M:%S')=='2016-07-02T00:00:00'
+        assert bt.convertDate('2016-07-02','%Y-%m-%d','%d %b %Y')=='02 Jul 2016'
+
 if __name__ == '__main__':
     unittest.main()